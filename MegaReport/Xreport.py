@@ -5,23 +5,31 @@ Streamlit-Cloud-ready • No Selenium • No WeasyPrint • Full Consistency
 """
 
 import streamlit as st
-from streamlit_folium import folium_static
+from streamlit_folium import st_folium
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import folium
+from folium.plugins import FastMarkerCluster
 import requests
+import requests_cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import orjson
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-from datetime import datetime, timedelta
-from geopy.geocoders import Nominatim
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import time
+import logging
 import numpy as np
 import base64
-from io import BytesIO
-import pdfkit
 
 # ----------------------------------------------------------------------
 # PAGE CONFIG & CSS
 # ----------------------------------------------------------------------
 st.set_page_config(page_title="Disaster Report", page_icon="globe", layout="wide")
+logger = logging.getLogger(__name__)
 
 def inject_css(primary, secondary, bg):
     st.markdown(f"""
@@ -43,20 +51,96 @@ def haversine(lat1, lon1, lat2, lon2):
     a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
     return R * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
 
-@st.cache_data(ttl=3600)
+# Shared request headers; NWS asks clients to identify themselves. Accept-Encoding
+# is left to requests, which already negotiates gzip/deflate (and br/zstd if installed)
+HTTP_HEADERS = {"User-Agent": "DisasterReport/1.0"}
+# (connect, read) timeouts: a dead host fails on connect instead of stalling a tab
+USGS_TIMEOUT = (3.05, 12)
+NWS_TIMEOUT = (3.05, 10)
+
+# On-disk HTTP cache lifetimes; first matching pattern wins
+HTTP_CACHE_EXPIRY = {
+    "earthquake.usgs.gov": 300,
+    "api.weather.gov/points": 86400,
+    "api.weather.gov/gridpoints": 600,
+    "api.weather.gov/alerts": 120,
+}
+
+@st.cache_resource
+def http_session():
+    """One keep-alive session per process, shared by every fetcher and worker thread.
+
+    Responses are also kept in a SQLite cache, so a restarted container
+    starts warm and serves stale data if an API is briefly down.
+    """
+    session = requests_cache.CachedSession(
+        # use_cache_dir puts the SQLite file in the user cache dir, not the working directory
+        "disaster_report_cache", backend="sqlite", use_cache_dir=True, urls_expire_after=HTTP_CACHE_EXPIRY,
+        allowable_codes=[200], allowable_methods=["GET"], stale_if_error=True,
+    )
+    session.headers.update(HTTP_HEADERS)
+    retry = Retry(total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504])
+    session.mount("https://", HTTPAdapter(pool_connections=8, pool_maxsize=16, max_retries=retry))
+    return session
+
+# geopy is imported on first City lookup; coordinate mode never loads it
+@st.cache_resource
+def geocoder():
+    from geopy.geocoders import Nominatim
+    return Nominatim(user_agent="disaster_app")
+
+# Nominatim's usage policy asks clients to cache results on their side.
+# Lookups persist to disk across restarts; errors raise so they are not cached.
+@st.cache_data(persist="disk", max_entries=1024, show_spinner=False)
+def cached_geocode(query):
+    loc = geocoder().geocode(query)
+    return (loc.latitude, loc.longitude) if loc else (None, None)
+
 def geocode(city):
+    from geopy.exc import GeopyError
+    query = " ".join(city.lower().replace(",", ", ").split())
     try:
-        loc = Nominatim(user_agent="disaster_app").geocode(city)
-        return (loc.latitude, loc.longitude) if loc else (None, None)
-    except:
+        return cached_geocode(query)
+    except GeopyError as e:
+        logger.warning("Geocoding %r failed: %s", city, e)
         return None, None
 
 # ----------------------------------------------------------------------
 # DATA: EARTHQUAKES (FIXED DATE LOGIC)
 # ----------------------------------------------------------------------
-@st.cache_data(ttl=1800)
+USGS_URL = "https://earthquake.usgs.gov/fdsnws/event/1/query"
+DIST_BINS = [0, 10, 100, 500, 1000]
+DIST_LABELS = ["0-10km", "11-100km", "101-500km", ">500km"]
+# Ranges longer than USGS_SLICE_MIN_DAYS are split into USGS_SLICE_DAYS
+# windows that are queried in parallel, each with its own result limit.
+USGS_SLICE_MIN_DAYS = 14
+USGS_SLICE_DAYS = 7
+# Bounds on one fetch: at most this many windows in flight at once (well under
+# the adapter pool), a range of at most USGS_MAX_DAYS, and USGS_MAX_EVENTS results
+USGS_MAX_WORKERS = 6
+USGS_MAX_DAYS = 180
+USGS_MAX_EVENTS = 1000
+
+def usgs_windows(start_date, end_date):
+    """(start, end) query windows covering the range, newest first."""
+    if (end_date - start_date).days <= USGS_SLICE_MIN_DAYS:
+        return [(start_date, end_date)]
+    step = timedelta(days=USGS_SLICE_DAYS)
+    windows = []
+    while start_date < end_date:
+        windows.append((start_date, min(start_date + step, end_date)))
+        start_date += step
+    return windows[::-1]
+
+def query_usgs(session, params):
+    r = session.get(USGS_URL, params=params, timeout=USGS_TIMEOUT)
+    r.raise_for_status()
+    return orjson.loads(r.content).get("features", [])
+
+@st.cache_data(ttl=300, show_spinner=False)
 def fetch_earthquakes(lat, lon, start_date, end_date, radius=1000):
-    today = datetime.now().date()
+    # USGS dates are UTC days, so cap against the UTC calendar day
+    today = pd.Timestamp.now(tz="UTC").date()
     
     # FIX: start_date and end_date are date objects → no .date()
     if end_date > today:
@@ -65,38 +149,43 @@ def fetch_earthquakes(lat, lon, start_date, end_date, radius=1000):
     if start_date > end_date:
         st.warning("Start > End → using last 30 days")
         start_date = today - timedelta(days=30)
+    if (end_date - start_date).days > USGS_MAX_DAYS:
+        start_date = end_date - timedelta(days=USGS_MAX_DAYS)
+        st.warning(f"Range limited to the last {USGS_MAX_DAYS} days: from {start_date}")
 
-    url = "https://earthquake.usgs.gov/fdsnws/event/1/query"
     params = {
         "format": "geojson",
-        "starttime": start_date.isoformat(),
-        "endtime": end_date.isoformat(),
         "latitude": lat,
         "longitude": lon,
         "maxradiuskm": radius,
         "orderby": "time-desc",
         "limit": 200
     }
-    headers = {"User-Agent": "DisasterReport/1.0"}
-
+    queries = [
+        dict(params, starttime=s.isoformat(), endtime=e.isoformat())
+        for s, e in usgs_windows(start_date, end_date)
+    ]
     try:
-        r = requests.get(url, params=params, headers=headers, timeout=12)
-        r.raise_for_status()
-        feats = r.json().get("features", [])
-        rows = []
-        for f in feats:
-            p = f["properties"]
-            c = f["geometry"]["coordinates"]
-            dist = haversine(lat, lon, c[1], c[0])
-            rows.append({
-                "time": datetime.fromtimestamp(p["time"]/1000),
-                "mag": p["mag"],
-                "depth": c[2],
-                "place": p["place"],
-                "dist_km": round(dist, 1),
-                "lat": c[1], "lon": c[0]
-            })
-        return pd.DataFrame(rows)
+        with ThreadPoolExecutor(max_workers=min(len(queries), USGS_MAX_WORKERS)) as ex:
+            # Resolve the cached session here, on a thread with a script context;
+            # the bare window workers only use the plain session object
+            batches = list(ex.map(partial(query_usgs, http_session()), queries))
+        # Windows share their boundary day, so drop repeated event ids; the
+        # batches are newest first, so the cap keeps the most recent events
+        feats = list({f["id"]: f for batch in batches for f in batch}.values())[:USGS_MAX_EVENTS]
+        if not feats:
+            return pd.DataFrame()
+        raw = pd.json_normalize(feats)
+        coords = np.array(raw["geometry.coordinates"].tolist(), dtype=np.float64)
+        df = pd.DataFrame({
+            "time": pd.to_datetime(raw["properties.time"], unit="ms", utc=True),
+            "mag": raw["properties.mag"],
+            "depth": coords[:, 2],
+            "place": raw["properties.place"],
+            "dist_km": haversine(lat, lon, coords[:, 1], coords[:, 0]).round(1),
+            "lat": coords[:, 1], "lon": coords[:, 0]
+        })
+        return df
     except requests.exceptions.HTTPError as e:
         if e.response.status_code == 400:
             st.error("Bad request: Check dates (cannot be future).")
@@ -110,42 +199,63 @@ def fetch_earthquakes(lat, lon, start_date, end_date, radius=1000):
 # ----------------------------------------------------------------------
 # DATA: WEATHER (US-only)
 # ----------------------------------------------------------------------
-@st.cache_data(ttl=1800)
+# (lat_min, lat_max, lon_min, lon_max) boxes NWS covers:
+# CONUS, Alaska, Hawaii, Puerto Rico/USVI, Guam/N. Marianas
+US_BOXES = [
+    (24.0, 50.0, -125.0, -66.0),
+    (51.0, 72.0, -180.0, -129.0),
+    (18.5, 22.5, -161.0, -154.5),
+    (17.5, 18.6, -67.5, -64.5),
+    (13.0, 21.0, 144.5, 146.5),
+]
+
+def in_us(lat, lon):
+    return any(a <= lat <= b and c <= lon <= d for a, b, c, d in US_BOXES)
+
+# Lookups and "not covered" answers are cached for the day; transient failures
+# (connection errors, 5xx) raise out of the cached function and are retried
+@st.cache_data(ttl=86400, show_spinner=False)
 def get_noaa_grid(lat, lon):
-    try:
-        r = requests.get(f"https://api.weather.gov/points/{lat},{lon}", timeout=10)
-        r.raise_for_status()
-        data = r.json()["properties"]
-        return data["forecast"]
-    except:
+    if not in_us(lat, lon):
+        return None
+    r = http_session().get(f"https://api.weather.gov/points/{lat},{lon}", timeout=NWS_TIMEOUT)
+    # US_BOXES is coarse (it takes in Toronto, Vancouver, northern Mexico);
+    # NWS answers those points with a permanent 404, so remember them as uncovered
+    if 400 <= r.status_code < 500:
         return None
+    r.raise_for_status()
+    return orjson.loads(r.content)["properties"]["forecast"]
 
-@st.cache_data(ttl=1800)
+@st.cache_data(ttl=600, show_spinner=False)
 def fetch_forecast(url):
     if not url:
         return pd.DataFrame()
     try:
-        r = requests.get(url, timeout=10)
+        r = http_session().get(url, timeout=NWS_TIMEOUT)
         r.raise_for_status()
-        periods = r.json()["properties"]["periods"][:14]
+        periods = orjson.loads(r.content)["properties"]["periods"][:14]
         return pd.DataFrame([
             {
                 "name": p["name"],
                 "temp": p["temperature"],
                 "wind": p["windSpeed"],
                 "cond": p["shortForecast"],
-                "precip": p.get("probabilityOfPrecipitation", {}).get("value", 0)
+                # NWS sends value: null when there is no PoP; store 0 so the column stays numeric
+                "precip": (p.get("probabilityOfPrecipitation") or {}).get("value") or 0
             } for p in periods
         ])
-    except:
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning("NWS forecast fetch failed: %s", e)
         return pd.DataFrame()
 
-@st.cache_data(ttl=900)
+@st.cache_data(ttl=120, show_spinner=False)
 def fetch_alerts(lat, lon):
+    if not in_us(lat, lon):
+        return pd.DataFrame()
     try:
-        r = requests.get(f"https://api.weather.gov/alerts/active?point={lat},{lon}", timeout=10)
+        r = http_session().get(f"https://api.weather.gov/alerts/active?point={lat},{lon}", timeout=NWS_TIMEOUT)
         r.raise_for_status()
-        feats = r.json().get("features", [])
+        feats = orjson.loads(r.content).get("features", [])
         return pd.DataFrame([
             {
                 "event": f["properties"]["event"],
@@ -154,52 +264,164 @@ def fetch_alerts(lat, lon):
                 "desc": f["properties"]["description"][:300]
             } for f in feats
         ])
-    except:
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        logger.warning("NWS alerts fetch failed for %s,%s: %s", lat, lon, e)
         return pd.DataFrame()
 
+# Fetched feeds are kept in session state for this long, so reruns with
+# unchanged inputs (tab clicks, Generate PDF) skip the fetch entirely.
+FEEDS_TTL = 120
+
+def cell(lat, lon, n=4):
+    """Snap coordinates to a ~11 m grid so near-identical inputs share cache entries."""
+    return round(lat, n), round(lon, n)
+
+def fetch_weather(lat, lon):
+    try:
+        url = get_noaa_grid(lat, lon)
+    except (requests.RequestException, ValueError, KeyError) as e:
+        logger.warning("NWS grid lookup failed for %s,%s: %s", lat, lon, e)
+        return pd.DataFrame()
+    return fetch_forecast(url)
+
+def load_feeds(lat, lon, start, end):
+    lat, lon = cell(lat, lon)
+    key = (lat, lon, start, end, int(time.time() // FEEDS_TTL))
+    if st.session_state.get("feeds_key") != key:
+        # The feeds hit different hosts, so fetch them side by side; the
+        # script context lets st.warning/st.error inside them still render.
+        ctx = get_script_run_ctx()
+        with st.spinner("Loading feeds..."):
+            with ThreadPoolExecutor(max_workers=3, initializer=add_script_run_ctx, initargs=(None, ctx)) as ex:
+                f_eq = ex.submit(fetch_earthquakes, lat, lon, start, end)
+                f_w = ex.submit(fetch_weather, lat, lon)
+                f_a = ex.submit(fetch_alerts, lat, lon)
+            quakes, forecast, alerts = f_eq.result(), f_w.result(), f_a.result()
+        st.session_state.feeds = (quakes, forecast, alerts)
+        st.session_state.feeds_key = key
+    return st.session_state.feeds
+
 # ----------------------------------------------------------------------
 # MAP
 # ----------------------------------------------------------------------
-def make_map(lat, lon, quakes=None, alerts=None):
-    m = folium.Map(location=[lat, lon], zoom_start=7)
+# Above this many quakes, markers are clustered client-side from a raw
+# [[lat, lon], ...] array instead of one styled CircleMarker per event.
+FAST_CLUSTER_MIN = 200
+
+def quake_style(feature):
+    props = feature["properties"]
+    return {"color": props["color"], "fillColor": props["color"], "radius": props["radius"]}
+
+def make_map(lat, lon, quakes=None):
+    # Canvas renderer draws all CircleMarkers into one <canvas> instead of an SVG node each
+    m = folium.Map(location=[lat, lon], zoom_start=7, prefer_canvas=True)
     folium.Marker([lat, lon], popup="Location", icon=folium.Icon(color="red")).add_to(m)
     if quakes is not None and not quakes.empty:
-        for _, q in quakes.iterrows():
-            color = "red" if q["mag"] >= 5 else "orange" if q["mag"] >= 3 else "green"
-            folium.CircleMarker(
-                [q["lat"], q["lon"]], radius=max(5, q["mag"]*2), color=color, fill=True,
-                popup=f"M{q['mag']} | {q['time'].strftime('%m/%d %H:%M')} | {q['dist_km']}km"
-            ).add_to(m)
+        if len(quakes) > FAST_CLUSTER_MIN:
+            FastMarkerCluster(quakes[["lat", "lon"]].values.tolist(), name="Quakes").add_to(m)
+            return m
+        mag = quakes["mag"].to_numpy()
+        colors = np.select([mag >= 5, mag >= 3], ["red", "orange"], default="green").tolist()
+        radii = np.fmax(5, mag * 2).astype(float).tolist()
+        popups = ("M" + quakes["mag"].astype(str) + " | " + quakes["time"].dt.strftime("%m/%d %H:%M")
+                  + " | " + quakes["dist_km"].astype(str) + "km").tolist()
+        features = [
+            {"type": "Feature", "geometry": {"type": "Point", "coordinates": [lo, la]},
+             "properties": {"color": color, "radius": radius, "popup": popup}}
+            for la, lo, radius, color, popup in zip(quakes["lat"].tolist(), quakes["lon"].tolist(), radii, colors, popups)
+        ]
+        folium.GeoJson(
+            {"type": "FeatureCollection", "features": features}, name="Quakes",
+            marker=folium.CircleMarker(fill=True),
+            style_function=quake_style,
+            popup=folium.GeoJsonPopup(fields=["popup"], labels=False),
+        ).add_to(m)
     return m
 
+# The built folium.Map is kept as a resource, so reruns skip marker construction;
+# st_folium only reads it when rendering
+@st.cache_resource(ttl=300, max_entries=32, show_spinner=False)
+def quake_map(lat, lon, quakes=None):
+    return make_map(lat, lon, quakes)
+
+# ----------------------------------------------------------------------
+# CHARTS
+# ----------------------------------------------------------------------
+def distance_counts(dist_km):
+    """Quake count per DIST_LABELS band (right-closed, as pd.cut would bin)."""
+    idx = np.searchsorted(DIST_BINS, dist_km, side="left") - 1
+    idx = idx[(idx >= 0) & (idx < len(DIST_LABELS))]
+    return pd.DataFrame({"band": DIST_LABELS, "count": np.bincount(idx, minlength=len(DIST_LABELS))})
+
+@st.cache_data(ttl=300, show_spinner=False)
+def distance_pie(quakes, prim, sec):
+    counts = distance_counts(quakes["dist_km"].to_numpy())
+    return px.pie(counts, names="band", values="count", color_discrete_sequence=[prim, sec])
+
+MAG_HIST_BINS = 20
+
+@st.cache_data(ttl=300, show_spinner=False)
+def mag_histogram(mag, prim):
+    """Magnitude histogram binned by NumPy; plotly only draws the bars."""
+    counts, edges = np.histogram(mag[~np.isnan(mag)], bins=MAG_HIST_BINS)
+    fig = px.bar(x=(edges[:-1] + edges[1:]) / 2, y=counts, labels={"x": "mag", "y": "count"},
+                 color_discrete_sequence=[prim])
+    fig.update_layout(bargap=0)
+    return fig
+
 # ----------------------------------------------------------------------
 # PDF (NO MAP PNG → NO SELENIUM)
 # ----------------------------------------------------------------------
+PDF_OPTIONS = {
+    "page-size": "Letter", "margin-top": "0.75in", "margin-bottom": "0.75in",
+    "margin-left": "0.75in", "margin-right": "0.75in", "encoding": "UTF-8"
+}
+
+PDF_CSS = """
+        body {font-family: Arial; margin: 1in; line-height: 1.6;}
+        h1 {text-align: center;}
+        h2 {border-bottom: 1px solid #ccc;}
+        table {width:100%; border-collapse: collapse; margin: 15px 0;}
+        th, td {border: 1px solid #ddd; padding: 8px; text-align: left;}
+        th {background: #f8f8f8;}
+        img {max-width: 100%; margin: 20px auto; display: block;}
+        .page-break {page-break-after: always;}
+"""
+
+# pdfkit is imported on first PDF export; most sessions never need it
+@st.cache_resource
+def pdf_config():
+    import pdfkit
+    return pdfkit.configuration(wkhtmltopdf="/usr/bin/wkhtmltopdf")
+
 def fig_to_b64(fig):
     return base64.b64encode(fig.to_image(format="png", engine="kaleido")).decode()
 
-def build_pdf_html(loc_name, quakes, forecast, alerts, prim, sec):
+@st.cache_data(ttl=300, show_spinner=False)
+def distance_pie_b64(quakes, prim, sec):
+    return fig_to_b64(distance_pie(quakes, prim, sec))
+
+def html_to_pdf(html):
+    import pdfkit
+    return pdfkit.from_string(html, False, configuration=pdf_config(), options=PDF_OPTIONS)
+
+# Keyed on everything the report shows, so a repeat click serves the same bytes
+@st.cache_data(ttl=600, show_spinner=False)
+def report_pdf(loc_name, lat, lon, start, end, quakes, forecast, alerts, prim, sec):
+    return html_to_pdf(build_pdf_html(loc_name, lat, lon, start, end, quakes, forecast, alerts, prim, sec))
+
+def build_pdf_html(loc_name, lat, lon, start, end, quakes, forecast, alerts, prim, sec):
     date_str = "October 25, 2025"
     pie_b64 = None
     if not quakes.empty:
-        bins = [0, 10, 100, 500, 1000]
-        labels = ["0-10km", "11-100km", "101-500km", ">500km"]
-        quakes["bin"] = pd.cut(quakes["dist_km"], bins=bins, labels=labels)
-        fig = px.pie(quakes["bin"].value_counts(), names=labels, color_discrete_sequence=[prim, sec])
-        pie_b64 = fig_to_b64(fig)
+        pie_b64 = distance_pie_b64(quakes, prim, sec)
 
-    html = f"""
+    parts = [f"""
     <!DOCTYPE html>
     <html><head><meta charset="utf-8">
-    <style>
-        body {{font-family: Arial; margin: 1in; line-height: 1.6;}}
-        h1 {{color: {prim}; text-align: center;}}
-        h2 {{color: {sec}; border-bottom: 1px solid #ccc;}}
-        table {{width:100%; border-collapse: collapse; margin: 15px 0;}}
-        th, td {{border: 1px solid #ddd; padding: 8px; text-align: left;}}
-        th {{background: #f8f8f8;}}
-        img {{max-width: 100%; margin: 20px auto; display: block;}}
-        .page-break {{page-break-after: always;}}
+    <style>{PDF_CSS}
+        h1 {{color: {prim};}}
+        h2 {{color: {sec};}}
     </style></head><body>
 
     <h1>Earthquake & Weather Report</h1>
@@ -208,24 +430,24 @@ def build_pdf_html(loc_name, quakes, forecast, alerts, prim, sec):
 
     <div class="page-break"></div>
     <h2>Summary</h2>
-    <p><strong>Location:</strong> {loc_name} ({st.session_state.lat:.4f}, {st.session_state.lon:.4f})</p>
-    <p><strong>Period:</strong> {st.session_state.start_date} to {st.session_state.end_date}</p>
+    <p><strong>Location:</strong> {loc_name} ({lat:.4f}, {lon:.4f})</p>
+    <p><strong>Period:</strong> {start} to {end}</p>
     <p><strong>Quakes:</strong> {len(quakes)} | <strong>Alerts:</strong> {len(alerts)}</p>
-    """
+    """]
     if pie_b64:
-        html += f'<img src="data:image/png;base64,{pie_b64}">'
-    html += '<div class="page-break"></div><h2>Top Earthquakes</h2>'
+        parts.append(f'<img src="data:image/png;base64,{pie_b64}">')
+    parts.append('<div class="page-break"></div><h2>Top Earthquakes</h2>')
     if not quakes.empty:
         top = quakes.head(10)[["time","mag","dist_km","place"]].copy()
         top["time"] = top["time"].dt.strftime("%Y-%m-%d %H:%M")
-        html += top.to_html(index=False)
-    html += '<div class="page-break"></div><h2>7-Day Forecast</h2>'
+        parts.append(top.to_html(index=False))
+    parts.append('<div class="page-break"></div><h2>7-Day Forecast</h2>')
     if not forecast.empty:
-        html += forecast[["name","temp","cond"]].to_html(index=False)
-    html += '<div class="page-break"></div><h2>Alerts</h2>'
-    html += alerts[["event","severity","area"]].to_html(index=False) if not alerts.empty else "<p>None</p>"
-    html += "</body></html>"
-    return html
+        parts.append(forecast[["name","temp","cond"]].to_html(index=False))
+    parts.append('<div class="page-break"></div><h2>Alerts</h2>')
+    parts.append(alerts[["event","severity","area"]].to_html(index=False) if not alerts.empty else "<p>None</p>")
+    parts.append("</body></html>")
+    return "".join(parts)
 
 # ----------------------------------------------------------------------
 # MAIN
@@ -238,9 +460,26 @@ def main():
     with st.sidebar:
         st.header("Settings")
         mode = st.radio("Input", ["City", "Coords"])
+        # Location and dates only apply on submit, so editing them doesn't
+        # rerun the fetch/render pipeline once per keystroke or click.
+        with st.form("controls"):
+            if mode == "City":
+                city = st.text_input("City", "San Francisco")
+            else:
+                lat_in = st.number_input("Lat", value=37.7749, format="%.6f")
+                lon_in = st.number_input("Lon", value=-122.4194, format="%.6f")
+
+            today = pd.Timestamp.now(tz="UTC").date()
+            default_start = today - timedelta(days=30)
+            col1, col2 = st.columns(2)
+            with col1:
+                start = st.date_input("Start", default_start)
+            with col2:
+                end = st.date_input("End", today)
+            submitted = st.form_submit_button("Run")
+
         if mode == "City":
-            city = st.text_input("City", "San Francisco")
-            if st.button("Geocode"):
+            if submitted:
                 with st.spinner("Finding..."):
                     lat, lon = geocode(city)
                     if lat:
@@ -252,43 +491,32 @@ def main():
             lat, lon = st.session_state.get("lat", 37.7749), st.session_state.get("lon", -122.4194)
             loc_name = st.session_state.get("loc_name", "San Francisco")
         else:
-            lat = st.number_input("Lat", value=37.7749, format="%.6f")
-            lon = st.number_input("Lon", value=-122.4194, format="%.6f")
+            lat, lon = lat_in, lon_in
             loc_name = f"Custom ({lat:.4f}, {lon:.4f})"
 
-        today = datetime.now().date()
-        default_start = today - timedelta(days=30)
-        col1, col2 = st.columns(2)
-        with col1:
-            start = st.date_input("Start", default_start)
-        with col2:
-            end = st.date_input("End", today)
-
         prim = st.color_picker("Primary", "#FF6B6B")
         sec = st.color_picker("Secondary", "#4ECDC4")
         bg = st.color_picker("BG", "#FFFFFF")
         inject_css(prim, sec, bg)
 
-    # === UPDATE SESSION STATE ===
-    st.session_state.update({
+    # === UPDATE SESSION STATE (only keys whose value changed) ===
+    state = {
         "lat": lat, "lon": lon, "loc_name": loc_name,
         "start_date": start, "end_date": end,
         "primary": prim, "secondary": sec
-    })
+    }
+    changed = {k: v for k, v in state.items() if st.session_state.get(k) != v}
+    if changed:
+        st.session_state.update(changed)
 
     # === MAP PREVIEW ===
     st.subheader("Location")
     preview = folium.Map(location=[lat, lon], zoom_start=9)
     folium.Marker([lat, lon], popup=loc_name).add_to(preview)
-    folium_static(preview, width=700, height=300)
+    st_folium(preview, width=700, height=300, returned_objects=[], key=f"preview_{lat:.3f}_{lon:.3f}")
 
     # === FETCH DATA ===
-    with st.spinner("Earthquakes..."):
-        quakes = fetch_earthquakes(lat, lon, start, end)
-    with st.spinner("Weather..."):
-        forecast = fetch_forecast(get_noaa_grid(lat, lon))
-    with st.spinner("Alerts..."):
-        alerts = fetch_alerts(lat, lon)
+    quakes, forecast, alerts = load_feeds(lat, lon, start, end)
 
     # === TABS ===
     t1, t2, t3, t4 = st.tabs(["Summary", "Quakes", "Weather", "Alerts"])
@@ -304,11 +532,7 @@ def main():
         col1, col2 = st.columns(2)
         with col1:
             if not quakes.empty:
-                bins = [0, 10, 100, 500, 1000]
-                labels = ["0-10km", "11-100km", "101-500km", ">500km"]
-                quakes["bin"] = pd.cut(quakes["dist_km"], bins=bins, labels=labels)
-                fig = px.pie(quakes["bin"].value_counts(), names=labels, color_discrete_sequence=[prim, sec])
-                st.plotly_chart(fig, use_container_width=True)
+                st.plotly_chart(distance_pie(quakes, prim, sec), use_container_width=True)
         with col2:
             if not forecast.empty:
                 daily = forecast[::2].head(7)
@@ -316,7 +540,8 @@ def main():
                 fig.update_traces(line_color=sec)
                 st.plotly_chart(fig, use_container_width=True)
 
-        folium_static(make_map(lat, lon, quakes, alerts), width=700, height=450)
+        st_folium(quake_map(lat, lon, quakes), width=700, height=450, returned_objects=[],
+                  key=f"overview_map_{lat:.3f}_{lon:.3f}")
 
     with t2:
         if quakes.empty:
@@ -325,16 +550,17 @@ def main():
             c1, c2, c3 = st.columns(3)
             c1.metric("Max Mag", f"M{quakes['mag'].max():.1f}")
             c2.metric("Avg Depth", f"{quakes['depth'].mean():.1f}km")
-            c3.metric("≤100km", len(quakes[quakes["dist_km"] <= 100]))
+            c3.metric("≤100km", int((quakes["dist_km"] <= 100).sum()))
             col1, col2 = st.columns(2)
             with col1:
                 st.plotly_chart(px.scatter(quakes, x="time", y="mag", size="dist_km"), use_container_width=True)
             with col2:
-                st.plotly_chart(px.histogram(quakes, x="mag", nbins=20, color_discrete_sequence=[prim]), use_container_width=True)
-            folium_static(make_map(lat, lon, quakes), width=700, height=400)
-            disp = quakes[["time","mag","dist_km","place"]].copy()
+                st.plotly_chart(mag_histogram(quakes["mag"].to_numpy(), prim), use_container_width=True)
+            st_folium(quake_map(lat, lon, quakes), width=700, height=400, returned_objects=[],
+                      key=f"quake_map_{lat:.3f}_{lon:.3f}")
+            disp = quakes.head(20)[["time","mag","dist_km","place"]].copy()
             disp["time"] = disp["time"].dt.strftime("%m/%d %H:%M")
-            st.dataframe(disp.head(20), use_container_width=True)
+            st.dataframe(disp, use_container_width=True)
 
     with t3:
         if forecast.empty:
@@ -360,20 +586,21 @@ def main():
                     st.write(f"**Area:** {a.area}<br>**Desc:** {a.desc}", unsafe_allow_html=True)
 
     # === PDF ===
+    # The bytes are kept in session state so the download button survives the
+    # rerun its own click triggers; the key ties them to the report inputs (not
+    # the feeds refresh bucket, so the button does not vanish every FEEDS_TTL)
+    pdf_key = (loc_name, lat, lon, start, end, prim, sec)
     if st.button("Generate PDF", type="primary"):
         with st.spinner("Creating PDF..."):
             try:
-                html = build_pdf_html(loc_name, quakes, forecast, alerts, prim, sec)
-                config = pdfkit.configuration(wkhtmltopdf="/usr/bin/wkhtmltopdf")
-                pdf = pdfkit.from_string(html, False, configuration=config, options={
-                    "page-size": "Letter", "margin-top": "0.75in", "margin-bottom": "0.75in",
-                    "margin-left": "0.75in", "margin-right": "0.75in", "encoding": "UTF-8"
-                })
-                b64 = base64.b64encode(pdf).decode()
-                st.markdown(f'<a href="data:application/pdf;base64,{b64}" download="{loc_name}_Report.pdf">Download PDF</a>', unsafe_allow_html=True)
+                st.session_state.pdf = report_pdf(loc_name, lat, lon, start, end, quakes, forecast, alerts, prim, sec)
+                st.session_state.pdf_key = pdf_key
                 st.success("Done!")
             except Exception as e:
                 st.error(f"PDF failed: {e}")
+    if st.session_state.get("pdf_key") == pdf_key:
+        st.download_button("Download PDF", data=st.session_state.pdf,
+                           file_name=f"{loc_name}_Report.pdf", mime="application/pdf")
 
 if __name__ == "__main__":
     main()
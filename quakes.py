@@ -1,9 +1,15 @@
 import streamlit as st
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-import time
+
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
 
 # Page configuration
 st.set_page_config(
@@ -34,8 +40,9 @@ COLOR_THEORY = {
     "sidebar_dark": "#1A237E"
 }
 
-# Enhanced CSS with proper contrast
-st.markdown(f"""
+# Enhanced CSS with proper contrast; COLOR_THEORY is fixed, so this is
+# formatted once here and emitted as-is on every run
+APP_CSS = f"""
 <style>
     .main, .stApp {{
         background: {COLOR_THEORY['cream_white']} !important;
@@ -143,7 +150,144 @@ st.markdown(f"""
         padding: 10px !important;
     }}
 </style>
-""", unsafe_allow_html=True)
+"""
+# Re-emitted on every rerun on purpose: an element that a run does not
+# write is removed from the page, so a once-per-session guard would drop the styles
+st.markdown(APP_CSS, unsafe_allow_html=True)
+
+# Sidebar brand header, formatted once from the fixed palette
+SIDEBAR_HEADER_HTML = f"""
+<div style='text-align: center; padding: 20px; background: {COLOR_THEORY["sidebar_dark"]}; border-radius: 10px; margin: 5px;'>
+    <div style="font-size: 2.5rem; color: white;">🌍</div>
+    <h2 style='color: white; margin: 10px 0;'>GeoWeather Intelligence</h2>
+    <p style='color: #E0E0E0; margin: 0; font-size: 0.9rem;'>Real-time Earth Analytics</p>
+</div>
+"""
+
+# KPI card CSS class per card type
+KPI_CARD_CLASSES = {
+    "earth": "earth-kpi",
+    "weather": "weather-kpi",
+    "alert": "alert-kpi"
+}
+
+# Alert badge color per severity level
+SEVERITY_COLORS = {
+    'Extreme': '#D32F2F',
+    'High': '#F57C00',
+    'Moderate': '#FFA000',
+    'Low': '#1976D2',
+    'Info': COLOR_THEORY['sky_blue']
+}
+
+# Earthquake table columns and their dtypes, shared by the USGS and fallback builders
+EARTHQUAKE_COLUMNS = {
+    'location': object,
+    'magnitude': np.float64,
+    'depth': np.float64,
+    'lat': np.float64,
+    'lon': np.float64,
+    'time': object,
+    'usgs_id': object,
+    'significance': np.int64,
+    'tsunami': np.int8
+}
+
+@st.cache_resource
+def http_session():
+    """One keep-alive session shared by all reruns and users, disk-cached when requests-cache is installed"""
+    # Imported here: this runs once per process, and only on the first data load
+    try:
+        from requests_cache import CachedSession
+    except ImportError:
+        session = requests.Session()
+    else:
+        # SQLite-backed, so responses survive a Streamlit restart; the file lives
+        # in the user cache dir rather than the working directory
+        session = CachedSession(
+            "geoweather_http_cache", backend="sqlite", use_cache_dir=True,
+            expire_after=300, stale_if_error=True
+        )
+    # The session is shared by every user, so keep a few sockets per host
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4, pool_maxsize=8,
+        max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504])
+    ))
+    return session
+
+@st.cache_data(ttl=300, show_spinner=False)
+def fetch_usgs_earthquakes(url, lat, lon, radius_km, starttime, endtime):
+    """Query USGS and flatten the events; cached, errors raise so they are never stored"""
+    params = {
+        'format': 'geojson',
+        'latitude': lat,
+        'longitude': lon,
+        'maxradiuskm': radius_km,
+        'starttime': starttime,
+        'endtime': endtime,
+        'minmagnitude': 2.0,  # Lower magnitude for more data
+        'orderby': 'time',
+        'limit': 50  # Get more events
+    }
+    
+    response = http_session().get(url, params=params, timeout=15)
+    response.raise_for_status()
+    data = json_loads(response.content)
+    features = data.get('features', [])
+    
+    # Fill one list per column, then build the frame with explicit dtypes
+    columns = {name: [] for name in EARTHQUAKE_COLUMNS}
+    for feature in features:
+        properties = feature.get('properties', {})
+        geometry = feature.get('geometry', {})
+        coords = geometry.get('coordinates', [0, 0, 0])
+        
+        columns['location'].append(properties.get('place', 'Unknown Location'))
+        columns['magnitude'].append(properties.get('mag', 0.0))
+        columns['depth'].append(coords[2] if len(coords) > 2 else 0.0)
+        columns['lat'].append(coords[1] if len(coords) > 1 else 0.0)
+        columns['lon'].append(coords[0] if len(coords) > 0 else 0.0)
+        columns['time'].append(properties.get('time') or 0)
+        columns['usgs_id'].append(feature.get('id', ''))
+        columns['significance'].append(properties.get('sig') or 0)
+        columns['tsunami'].append(1 if properties.get('tsunami', 0) == 1 else 0)
+    
+    # Epoch milliseconds -> UTC timestamp strings in one vectorized conversion
+    columns['time'] = pd.to_datetime(
+        np.asarray(columns['time'], dtype=np.int64), unit='ms', utc=True
+    ).strftime('%Y-%m-%d %H:%M:%S')
+    return pd.DataFrame({
+        name: np.asarray(values, dtype=EARTHQUAKE_COLUMNS[name]) for name, values in columns.items()
+    })
+
+# Magnitude bands for the analytics page: [2, 4), [4, 6), [6, inf)
+MAGNITUDE_BINS = [2.0, 4.0, 6.0, np.inf]
+MAGNITUDE_LABELS = ['2.0-3.9 (Light)', '4.0-5.9 (Moderate)', '6.0+ (Strong)']
+# Depth class boundaries in km: shallow < 70 <= intermediate < 300 <= deep
+DEPTH_BOUNDS = [70, 300]
+
+# Known city coordinates, keyed by lower-cased name
+CITY_COORDINATES = {
+    "london": (51.5074, -0.1278),
+    "new york": (40.7128, -74.0060),
+    "tokyo": (35.6762, 139.6503),
+    "paris": (48.8566, 2.3522),
+    "sydney": (-33.8688, 151.2093),
+    "los angeles": (34.0522, -118.2437),
+    "chicago": (41.8781, -87.6298),
+    "toronto": (43.6532, -79.3832),
+    "mumbai": (19.0760, 72.8777),
+    "berlin": (52.5200, 13.4050),
+    "dubai": (25.2048, 55.2708),
+    "singapore": (1.3521, 103.8198),
+    "seoul": (37.5665, 126.9780),
+    "moscow": (55.7558, 37.6173),
+    "cairo": (30.0444, 31.2357),
+    "london uk": (51.5074, -0.1278),
+    "new york city": (40.7128, -74.0060),
+    "san francisco": (37.7749, -122.4194),
+    "tokyo japan": (35.6762, 139.6503)
+}
 
 class GeoWeatherIntelligence:
     def __init__(self):
@@ -152,31 +296,9 @@ class GeoWeatherIntelligence:
         
     def get_city_coordinates(self, city_name):
         """Get coordinates with comprehensive city database"""
-        city_coordinates = {
-            "london": (51.5074, -0.1278),
-            "new york": (40.7128, -74.0060),
-            "tokyo": (35.6762, 139.6503),
-            "paris": (48.8566, 2.3522),
-            "sydney": (-33.8688, 151.2093),
-            "los angeles": (34.0522, -118.2437),
-            "chicago": (41.8781, -87.6298),
-            "toronto": (43.6532, -79.3832),
-            "mumbai": (19.0760, 72.8777),
-            "berlin": (52.5200, 13.4050),
-            "dubai": (25.2048, 55.2708),
-            "singapore": (1.3521, 103.8198),
-            "seoul": (37.5665, 126.9780),
-            "moscow": (55.7558, 37.6173),
-            "cairo": (30.0444, 31.2357),
-            "london uk": (51.5074, -0.1278),
-            "new york city": (40.7128, -74.0060),
-            "san francisco": (37.7749, -122.4194),
-            "tokyo japan": (35.6762, 139.6503)
-        }
-        
         city_lower = city_name.lower().strip()
-        if city_lower in city_coordinates:
-            lat, lon = city_coordinates[city_lower]
+        if city_lower in CITY_COORDINATES:
+            lat, lon = CITY_COORDINATES[city_lower]
             return lat, lon
         
         # Default to London if not found
@@ -185,49 +307,18 @@ class GeoWeatherIntelligence:
     def get_earthquake_data(self, lat, lon, radius_km=500):
         """Get real earthquake data from USGS with enhanced dataset"""
         try:
-            # Calculate date range (past 30 days)
-            end_date = datetime.now()
+            # Calculate date range (past 30 days) as UTC day buckets, matching USGS
+            end_date = pd.Timestamp.now(tz='UTC').date()
             start_date = end_date - timedelta(days=30)
             
-            # USGS API query for significant earthquakes
-            url = f"{self.usgs_base}/query"
-            params = {
-                'format': 'geojson',
-                'latitude': lat,
-                'longitude': lon,
-                'maxradiuskm': radius_km,
-                'starttime': start_date.strftime('%Y-%m-%d'),
-                'endtime': end_date.strftime('%Y-%m-%d'),
-                'minmagnitude': 2.0,  # Lower magnitude for more data
-                'orderby': 'time',
-                'limit': 50  # Get more events
-            }
-            
-            response = requests.get(url, params=params, timeout=15)
-            if response.status_code == 200:
-                data = response.json()
-                earthquakes = []
-                
-                for feature in data.get('features', []):
-                    properties = feature.get('properties', {})
-                    geometry = feature.get('geometry', {})
-                    coords = geometry.get('coordinates', [0, 0, 0])
-                    
-                    earthquake = {
-                        'location': properties.get('place', 'Unknown Location'),
-                        'magnitude': properties.get('mag', 0.0),
-                        'depth': coords[2] if len(coords) > 2 else 0.0,
-                        'lat': coords[1] if len(coords) > 1 else 0.0,
-                        'lon': coords[0] if len(coords) > 0 else 0.0,
-                        'time': datetime.fromtimestamp(properties.get('time', 0) / 1000).strftime('%Y-%m-%d %H:%M:%S'),
-                        'usgs_id': feature.get('id', ''),
-                        'significance': properties.get('sig', 0),
-                        'tsunami': 1 if properties.get('tsunami', 0) == 1 else 0
-                    }
-                    earthquakes.append(earthquake)
-                
-                if earthquakes:
-                    return earthquakes
+            # USGS API query for significant earthquakes; ~100 m coordinate
+            # precision keeps the cache key stable for the same place
+            earthquakes = fetch_usgs_earthquakes(
+                f"{self.usgs_base}/query", round(lat, 3), round(lon, 3), radius_km,
+                start_date.isoformat(), end_date.isoformat()
+            )
+            if not earthquakes.empty:
+                return earthquakes
                 
         except Exception as e:
             st.error(f"Error fetching USGS earthquake data: {str(e)}")
@@ -237,11 +328,11 @@ class GeoWeatherIntelligence:
     
     def get_fallback_earthquakes(self, lat, lon):
         """Comprehensive fallback earthquake data"""
-        base_time = datetime.now() - timedelta(days=30)
-        earthquakes = []
+        # UTC, like the USGS event times, so both sources share one clock in the table
+        base_time = pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=30)
         
         # Create realistic earthquake data around the coordinates
-        magnitudes = [2.5, 3.1, 4.2, 2.8, 3.7, 5.1, 2.9, 3.5, 4.8, 3.2, 2.7, 4.1]
+        magnitudes = np.array([2.5, 3.1, 4.2, 2.8, 3.7, 5.1, 2.9, 3.5, 4.8, 3.2, 2.7, 4.1])
         locations = [
             "Pacific Ocean", "North Atlantic Ridge", "Mediterranean Sea", 
             "Indian Ocean", "Caribbean Sea", "South Pacific", 
@@ -249,23 +340,23 @@ class GeoWeatherIntelligence:
             "San Andreas Fault", "Himalayan Front", "Andean Belt"
         ]
         
-        for i, mag in enumerate(magnitudes):
-            time_offset = timedelta(days=i*2, hours=i*3)
-            quake_time = base_time + time_offset
-            
-            earthquakes.append({
-                'location': f"{locations[i % len(locations)]} Region",
-                'magnitude': mag,
-                'depth': np.random.uniform(5, 50),
-                'lat': lat + np.random.uniform(-2, 2),
-                'lon': lon + np.random.uniform(-2, 2),
-                'time': quake_time.strftime('%Y-%m-%d %H:%M:%S'),
-                'usgs_id': f'fallback_{i+1}',
-                'significance': int(mag * 50),
-                'tsunami': 1 if mag > 6.5 else 0
-            })
+        # Draw and derive every column as a whole array rather than per quake
+        n = len(magnitudes)
+        idx = np.arange(n)
+        times = base_time + pd.to_timedelta(idx * 2, unit='D') + pd.to_timedelta(idx * 3, unit='h')
+        columns = {
+            'location': [f"{locations[i % len(locations)]} Region" for i in range(n)],
+            'magnitude': magnitudes.tolist(),
+            'depth': np.random.uniform(5, 50, n).tolist(),
+            'lat': (lat + np.random.uniform(-2, 2, n)).tolist(),
+            'lon': (lon + np.random.uniform(-2, 2, n)).tolist(),
+            'time': times.strftime('%Y-%m-%d %H:%M:%S').tolist(),
+            'usgs_id': [f'fallback_{i+1}' for i in range(n)],
+            'significance': (magnitudes * 50).astype(int).tolist(),
+            'tsunami': (magnitudes > 6.5).astype(int).tolist()
+        }
         
-        return earthquakes
+        return pd.DataFrame(columns).astype(EARTHQUAKE_COLUMNS)
     
     def get_weather_data(self, lat, lon):
         """Get comprehensive weather data with multiple data points"""
@@ -377,11 +468,7 @@ class GeoWeatherIntelligence:
 
 def create_kpi_card(title, value, subtitle, card_type="earth"):
     """Create KPI cards with high contrast"""
-    card_class = {
-        "earth": "earth-kpi",
-        "weather": "weather-kpi", 
-        "alert": "alert-kpi"
-    }.get(card_type, "earth-kpi")
+    card_class = KPI_CARD_CLASSES.get(card_type, "earth-kpi")
     
     return f"""
     <div class="{card_class}">
@@ -396,13 +483,7 @@ def main():
     
     # Sidebar with improved UX
     with st.sidebar:
-        st.markdown(f"""
-        <div style='text-align: center; padding: 20px; background: {COLOR_THEORY["sidebar_dark"]}; border-radius: 10px; margin: 5px;'>
-            <div style="font-size: 2.5rem; color: white;">🌍</div>
-            <h2 style='color: white; margin: 10px 0;'>GeoWeather Intelligence</h2>
-            <p style='color: #E0E0E0; margin: 0; font-size: 0.9rem;'>Real-time Earth Analytics</p>
-        </div>
-        """, unsafe_allow_html=True)
+        st.markdown(SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
         
         st.markdown("---")
         
@@ -433,7 +514,8 @@ def main():
                     'lon': lon,
                     'radius_km': radius_km,
                     'earthquake_data': earthquake_data,
-                    'weather_data': weather_data,
+                    # Tabulated once here; every page reads the same frame
+                    'weather_data': pd.DataFrame(weather_data),
                     'severe_alerts': alert_data,
                     'data_loaded': True
                 })
@@ -447,7 +529,7 @@ def main():
                        label_visibility="collapsed")
         
         st.markdown("---")
-        st.markdown(f"""
+        st.markdown("""
         <div style='color: #E0E0E0; font-size: 0.8rem;'>
         <p><strong>🌐 Data Sources:</strong></p>
         <ul>
@@ -563,7 +645,7 @@ def show_dashboard():
             </div>
             <div>
                 <p><strong>Search Radius:</strong> {radius} km</p>
-                <p><strong>Last Updated:</strong> {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}</p>
+                <p><strong>Last Updated:</strong> {pd.Timestamp.now(tz='UTC').strftime('%Y-%m-%d %H:%M:%S')} UTC</p>
             </div>
         </div>
     </div>
@@ -590,9 +672,9 @@ def show_dashboard():
     st.markdown("<div class='subsection-header'>🌋 Recent Seismic Activity</div>", unsafe_allow_html=True)
     
     earthquake_data = st.session_state.earthquake_data
-    if earthquake_data:
+    if not earthquake_data.empty:
         try:
-            eq_df = pd.DataFrame(earthquake_data)
+            eq_df = earthquake_data
             
             # Enhanced Earthquake Metrics
             col1, col2, col3, col4 = st.columns(4)
@@ -617,9 +699,11 @@ def show_dashboard():
             display_cols = [col for col in ['location', 'magnitude', 'depth', 'time', 'significance'] 
                           if col in eq_df.columns]
             if display_cols:
-                # Show more rows with better formatting
+                # Show more rows with better formatting; order on the time column alone,
+                # then gather just the 15 newest rows
+                newest = eq_df['time'].sort_values(ascending=False).index[:15]
                 st.dataframe(
-                    eq_df[display_cols].sort_values('time', ascending=False).head(15),
+                    eq_df.loc[newest, display_cols],
                     use_container_width=True,
                     height=400
                 )
@@ -638,9 +722,9 @@ def show_dashboard():
     st.markdown("<div class='subsection-header'>🌤️ Weather Conditions & Trends</div>", unsafe_allow_html=True)
     
     weather_data = st.session_state.weather_data
-    if weather_data:
+    if not weather_data.empty:
         try:
-            weather_df = pd.DataFrame(weather_data)
+            weather_df = weather_data
             
             if not weather_df.empty:
                 # Current Weather Summary
@@ -678,6 +762,7 @@ def show_dashboard():
     alerts_data = st.session_state.severe_alerts
     if alerts_data:
         try:
+            cards = []
             for alert in alerts_data:
                 alert_type = alert.get('type', 'Unknown')
                 severity = alert.get('severity', 'Moderate')
@@ -687,15 +772,9 @@ def show_dashboard():
                 end_time = alert.get('end', 'Unknown')
                 
                 # Color based on severity
-                severity_color = {
-                    'Extreme': '#D32F2F',
-                    'High': '#F57C00',
-                    'Moderate': '#FFA000',
-                    'Low': '#1976D2',
-                    'Info': COLOR_THEORY['sky_blue']
-                }.get(severity, COLOR_THEORY['warm_amber'])
+                severity_color = SEVERITY_COLORS.get(severity, COLOR_THEORY['warm_amber'])
                 
-                st.markdown(f"""
+                cards.append(f"""
                 <div class='data-card'>
                     <div style="display: flex; justify-content: space-between; align-items: start; margin-bottom: 10px;">
                         <h4 style="margin: 0; color: {COLOR_THEORY['text_dark']};">{alert_type}</h4>
@@ -709,7 +788,10 @@ def show_dashboard():
                         {description}
                     </p>
                 </div>
-                """, unsafe_allow_html=True)
+                """)
+            
+            # One markdown element for all cards instead of one per alert
+            st.markdown("".join(cards), unsafe_allow_html=True)
                 
         except Exception as e:
             st.error(f"Error processing alert data: {str(e)}")
@@ -725,18 +807,16 @@ def show_analytics():
     with col1:
         st.markdown("<div class='subsection-header'>🌋 Earthquake Analytics</div>", unsafe_allow_html=True)
         
-        if st.session_state.earthquake_data:
+        if not st.session_state.earthquake_data.empty:
             try:
-                eq_df = pd.DataFrame(st.session_state.earthquake_data)
+                eq_df = st.session_state.earthquake_data
                 
-                if not eq_df.empty and 'magnitude' in eq_df.columns:
+                if 'magnitude' in eq_df.columns:
                     # Magnitude distribution
                     st.markdown("#### 📈 Magnitude Distribution")
-                    magnitude_ranges = {
-                        '2.0-3.9 (Light)': len(eq_df[(eq_df['magnitude'] >= 2.0) & (eq_df['magnitude'] < 4.0)]),
-                        '4.0-5.9 (Moderate)': len(eq_df[(eq_df['magnitude'] >= 4.0) & (eq_df['magnitude'] < 6.0)]),
-                        '6.0+ (Strong)': len(eq_df[eq_df['magnitude'] >= 6.0])
-                    }
+                    mags = eq_df['magnitude'].to_numpy(dtype=float)
+                    counts, _ = np.histogram(mags[~np.isnan(mags)], bins=MAGNITUDE_BINS)
+                    magnitude_ranges = dict(zip(MAGNITUDE_LABELS, counts.tolist()))
                     
                     for range_name, count in magnitude_ranges.items():
                         if count > 0:
@@ -759,13 +839,15 @@ def show_analytics():
                     # Depth analysis
                     if 'depth' in eq_df.columns:
                         st.markdown("#### 🏔️ Depth Analysis")
-                        shallow = len(eq_df[eq_df['depth'] < 70])
-                        intermediate = len(eq_df[(eq_df['depth'] >= 70) & (eq_df['depth'] < 300)])
-                        deep = len(eq_df[eq_df['depth'] >= 300])
+                        depths = eq_df['depth'].to_numpy(dtype=float)
+                        depth_class = np.searchsorted(DEPTH_BOUNDS, depths[~np.isnan(depths)], side='right')
+                        shallow, intermediate, deep = np.bincount(depth_class, minlength=3).tolist()
                         
-                        st.write(f"**Shallow** (< 70 km): {shallow} events")
-                        st.write(f"**Intermediate** (70-300 km): {intermediate} events")
-                        st.write(f"**Deep** (> 300 km): {deep} events")
+                        st.markdown(
+                            f"**Shallow** (< 70 km): {shallow} events\n\n"
+                            f"**Intermediate** (70-300 km): {intermediate} events\n\n"
+                            f"**Deep** (> 300 km): {deep} events"
+                        )
                         
             except Exception as e:
                 st.error(f"Error calculating earthquake statistics: {str(e)}")
@@ -773,9 +855,9 @@ def show_analytics():
     with col2:
         st.markdown("<div class='subsection-header'>🌤️ Weather Analytics</div>", unsafe_allow_html=True)
         
-        if st.session_state.weather_data:
+        if not st.session_state.weather_data.empty:
             try:
-                weather_df = pd.DataFrame(st.session_state.weather_data)
+                weather_df = st.session_state.weather_data
                 
                 if not weather_df.empty:
                     st.markdown("#### 🌡️ Temperature Analysis")
@@ -800,8 +882,9 @@ def show_analytics():
                     if 'condition' in weather_df.columns:
                         st.markdown("#### ☁️ Condition Frequency")
                         condition_counts = weather_df['condition'].value_counts()
-                        for condition, count in condition_counts.items():
-                            st.write(f"**{condition}**: {count} records")
+                        st.markdown("\n\n".join(
+                            f"**{condition}**: {count} records" for condition, count in condition_counts.items()
+                        ))
                             
             except Exception as e:
                 st.error(f"Error calculating weather statistics: {str(e)}")
@@ -814,9 +897,9 @@ def show_full_datasets():
     
     with tab1:
         st.markdown("<div class='subsection-header'>USGS Earthquake Dataset</div>", unsafe_allow_html=True)
-        if st.session_state.earthquake_data:
+        if not st.session_state.earthquake_data.empty:
             try:
-                eq_df = pd.DataFrame(st.session_state.earthquake_data)
+                eq_df = st.session_state.earthquake_data
                 
                 # Show full dataset
                 st.dataframe(eq_df, use_container_width=True, height=600)
@@ -844,9 +927,9 @@ def show_full_datasets():
     
     with tab2:
         st.markdown("<div class='subsection-header'>Complete Weather Dataset</div>", unsafe_allow_html=True)
-        if st.session_state.weather_data:
+        if not st.session_state.weather_data.empty:
             try:
-                weather_df = pd.DataFrame(st.session_state.weather_data)
+                weather_df = st.session_state.weather_data
                 st.dataframe(weather_df, use_container_width=True, height=400)
                 
                 st.markdown("#### 🌤️ Weather Summary")